@@ -23,6 +23,12 @@ from .config import (
     ENDPOINT_UPLOAD_URL,
 )
 from .emailnator import Emailnator
+from .utils import parse_nested_json_response
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # orjson is optional; its JSONDecodeError subclasses json's
+    from json import loads as _json_loads  # type: ignore[assignment]
 
 
 class Client:
@@ -51,6 +57,9 @@ class Client:
         # Unique timestamp for session identification
         self.timestamp = format(random.getrandbits(32), "08x")
 
+        # Async session for asearch(), created on first use inside an event loop
+        self._async_session = None
+
         # Initialize session by making a GET request
         self.session.get(ENDPOINT_AUTH_SESSION)
 
@@ -131,6 +140,54 @@ class Client:
         - follow_up: Information for follow-up queries.
         - incognito: Whether to enable incognito mode.
         """
+        json_data = self._prepare_search(
+            query, mode, model, sources, files, language, follow_up, incognito
+        )
+
+        # Send the query request and handle the response
+        resp = self.session.post(ENDPOINT_SSE_ASK, json=json_data, stream=True)
+
+        if resp.status_code == 401:
+            raise Exception("Perplexity Auth Error: Cookies Expired (401)")
+
+        if not resp.ok:
+            raise Exception(f"HTTP Error {resp.status_code}: {resp.text}")
+
+        def stream_response(resp):
+            """
+            Generator for streaming responses.
+            """
+            for chunk in resp.iter_lines(delimiter=b"\r\n\r\n"):
+                content = chunk.decode("utf-8")
+
+                if content.startswith("event: message\r\n"):
+                    content_json = self._parse_message(content)
+                    if content_json is not None:
+                        yield content_json
+
+                elif content.startswith("event: end_of_stream\r\n"):
+                    return
+
+        if stream:
+            return stream_response(resp)
+
+        # Each message carries the full response so far, so only the latest is kept
+        last = {}
+        for chunk in resp.iter_lines(delimiter=b"\r\n\r\n"):
+            content = chunk.decode("utf-8")
+
+            if content.startswith("event: message\r\n"):
+                content_json = self._parse_message(content)
+                if content_json is not None:
+                    last = content_json
+
+            elif content.startswith("event: end_of_stream\r\n"):
+                return last
+
+    def _prepare_search(self, query, mode, model, sources, files, language, follow_up, incognito):
+        """
+        Validates search arguments, uploads any files and builds the SSE ask payload.
+        """
         # Validate input parameters
         assert mode in [
             "auto",
@@ -260,89 +317,101 @@ class Client:
             },
         }
 
-        # Send the query request and handle the response
-        resp = self.session.post(ENDPOINT_SSE_ASK, json=json_data, stream=True)
+        return json_data
+
+    @staticmethod
+    def _parse_message(content):
+        """
+        Decodes one 'event: message' SSE block, unpacking the nested 'text' steps
+        and the FINAL answer. Returns None if the block is not valid JSON.
+        """
+        try:
+            content_json = _json_loads(content[len("event: message\r\ndata: ") :])
+        except json.JSONDecodeError:
+            return None
+
+        return parse_nested_json_response(content_json)
+
+    def _get_async_session(self):
+        """
+        Returns the AsyncSession used by asearch(), sharing this client's cookies.
+        """
+        if self._async_session is None:
+            self._async_session = requests.AsyncSession(
+                headers=DEFAULT_HEADERS.copy(),
+                cookies=self.session.cookies,
+                impersonate="chrome",
+            )
+        return self._async_session
+
+    @property
+    def has_async_session(self):
+        """
+        Whether asearch() has opened an AsyncSession that aclose() should close.
+        """
+        return self._async_session is not None
+
+    async def aclose(self):
+        """
+        Closes the AsyncSession opened by asearch(), if any.
+        """
+        if self._async_session is not None:
+            await self._async_session.close()
+            self._async_session = None
+
+    async def asearch(
+        self,
+        query,
+        mode="auto",
+        model=None,
+        sources=["web"],
+        stream=False,
+        language="en-US",
+        follow_up=None,
+        incognito=False,
+    ):
+        """
+        Awaitable variant of search() for callers running inside an event loop.
+
+        Takes the same parameters as search() except 'files': uploads are blocking,
+        so use search() for queries with attachments. With stream=True an async
+        generator of partial responses is returned.
+        """
+        json_data = self._prepare_search(
+            query, mode, model, sources, {}, language, follow_up, incognito
+        )
+
+        resp = await self._get_async_session().post(ENDPOINT_SSE_ASK, json=json_data, stream=True)
 
         if resp.status_code == 401:
+            await resp.aclose()
             raise Exception("Perplexity Auth Error: Cookies Expired (401)")
 
         if not resp.ok:
-            raise Exception(f"HTTP Error {resp.status_code}: {resp.text}")
+            raise Exception(f"HTTP Error {resp.status_code}: {await resp.atext()}")
 
-        chunks = []
-
-        def stream_response(resp):
+        async def stream_response(resp):
             """
-            Generator for streaming responses.
+            Async generator for streaming responses.
             """
-            for chunk in resp.iter_lines(delimiter=b"\r\n\r\n"):
-                content = chunk.decode("utf-8")
+            try:
+                async for chunk in resp.aiter_lines(delimiter=b"\r\n\r\n"):
+                    content = chunk.decode("utf-8")
 
-                if content.startswith("event: message\r\n"):
-                    try:
-                        content_json = json.loads(content[len("event: message\r\ndata: ") :])
-
-                        # Parse the nested 'text' field if it exists
-                        if "text" in content_json and content_json["text"]:
-                            try:
-                                text_parsed = json.loads(content_json["text"])
-                                # Extract answer from FINAL step if available
-                                if isinstance(text_parsed, list):
-                                    for step in text_parsed:
-                                        if step.get("step_type") == "FINAL":
-                                            final_content = step.get("content", {})
-                                            if "answer" in final_content:
-                                                answer_data = json.loads(final_content["answer"])
-                                                content_json["answer"] = answer_data.get(
-                                                    "answer", ""
-                                                )
-                                                content_json["chunks"] = answer_data.get(
-                                                    "chunks", []
-                                                )
-                                                break
-                                content_json["text"] = text_parsed
-                            except (json.JSONDecodeError, TypeError, KeyError):
-                                pass
-
-                        chunks.append(content_json)
-                        yield chunks[-1]
-                    except (json.JSONDecodeError, KeyError):
-                        continue
+                    if content.startswith("event: message\r\n"):
+                        content_json = self._parse_message(content)
+                        if content_json is not None:
+                            yield content_json
 
-                elif content.startswith("event: end_of_stream\r\n"):
-                    return
+                    elif content.startswith("event: end_of_stream\r\n"):
+                        return
+            finally:
+                await resp.aclose()
 
         if stream:
             return stream_response(resp)
 
-        for chunk in resp.iter_lines(delimiter=b"\r\n\r\n"):
-            content = chunk.decode("utf-8")
-
-            if content.startswith("event: message\r\n"):
-                try:
-                    content_json = json.loads(content[len("event: message\r\ndata: ") :])
-
-                    # Parse the nested 'text' field if it exists
-                    if "text" in content_json and content_json["text"]:
-                        try:
-                            text_parsed = json.loads(content_json["text"])
-                            # Extract answer from FINAL step if available
-                            if isinstance(text_parsed, list):
-                                for step in text_parsed:
-                                    if step.get("step_type") == "FINAL":
-                                        final_content = step.get("content", {})
-                                        if "answer" in final_content:
-                                            answer_data = json.loads(final_content["answer"])
-                                            content_json["answer"] = answer_data.get("answer", "")
-                                            content_json["chunks"] = answer_data.get("chunks", [])
-                                            break
-                            content_json["text"] = text_parsed
-                        except (json.JSONDecodeError, TypeError, KeyError):
-                            pass
-
-                    chunks.append(content_json)
-                except (json.JSONDecodeError, KeyError):
-                    continue
-
-            elif content.startswith("event: end_of_stream\r\n"):
-                return chunks[-1] if chunks else {}
+        last = {}
+        async for content_json in stream_response(resp):
+            last = content_json
+        return last
@@ -3,20 +3,94 @@ Client pool for managing multiple Perplexity API tokens with load balancing.
 Provides weighted round-robin client selection with exponential backoff retry.
 """
 
-import json
+import heapq
+import itertools
 import os
 import pathlib
+import sys
 import threading
 import time
-from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
 
 from .client import Client
+from .exceptions import NoClientAvailableError, PoolRateLimitedError
+
+try:
+    from fastrlock.rlock import FastRLock as _Lock
+except ImportError:  # fastrlock is optional; fall back to the stdlib mutex
+    from threading import Lock as _Lock
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # orjson is optional; stdlib json accepts bytes too
+    from json import loads as _json_loads  # type: ignore[assignment]
+
+# Shared cookie keys so every client's cookie dict reuses the same key objects
+CSRF_KEY = sys.intern("next-auth.csrf-token")
+SESSION_KEY = sys.intern("__Secure-next-auth.session-token")
+
+
+@lru_cache(maxsize=4096)
+def _format_utc(timestamp: int) -> str:
+    """Format a UNIX timestamp as an ISO 8601 UTC string."""
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(timestamp))
+
+
+class _ShardedRWLock:
+    """Reader-writer lock built from a fixed set of mutex shards.
+
+    Each thread reads through its own shard, so concurrent readers rarely
+    contend; writers acquire every shard to exclude all readers.
+    """
+
+    def __init__(self, shards: int = 8):
+        self._shards = tuple(_Lock() for _ in range(shards))
+        self._assign = itertools.count()
+        self._local = threading.local()
+
+    def read(self) -> Any:
+        """Return the calling thread's shard, for use in a ``with`` block."""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = self._shards[next(self._assign) % len(self._shards)]
+        return shard
+
+    def write(self) -> "_ShardedRWLock":
+        """Return self, for use in a ``with`` block that holds every shard."""
+        return self
+
+    def __enter__(self) -> None:
+        for shard in self._shards:
+            shard.acquire()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        for shard in reversed(self._shards):
+            shard.release()
 
 
 class ClientWrapper:
     """Wrapper for Client with failure tracking and weight management."""
 
+    __slots__ = (
+        "client",
+        "id",
+        "weight",
+        "fail_count",
+        "available_after",
+        "request_count",
+        "enabled",
+        "state",
+        "in_flight",
+        "capacity",
+        "refill_rate",
+        "tokens",
+        "last_refill",
+        "_lock",
+    )
+
     DEFAULT_WEIGHT = 100
     MIN_WEIGHT = 10
     WEIGHT_DECAY = 10
@@ -24,7 +98,13 @@ class ClientWrapper:
     INITIAL_BACKOFF = 60
     MAX_BACKOFF = 3600
 
-    def __init__(self, client: Client, client_id: str):
+    def __init__(
+        self,
+        client: Client,
+        client_id: str,
+        rate_limit: Optional[Dict[str, Any]] = None,
+        workers: int = 1,
+    ):
         self.client = client
         self.id = client_id
         self.weight = self.DEFAULT_WEIGHT
@@ -33,39 +113,104 @@ class ClientWrapper:
         self.request_count = 0
         self.enabled = True
         self.state = "unknown"
-
-    def is_available(self) -> bool:
+        self.in_flight = 0
+        # Token bucket refilled at requests_per_minute; no rate_limit means unlimited.
+        # When several server processes each hold a pool, the budget is split
+        # evenly across them. The refill rate splits exactly; each share of the
+        # burst is rounded up to one token, so with burst < workers the combined
+        # burst is `workers` requests.
+        self.capacity: Optional[float] = None
+        self.refill_rate = 0.0
+        self.tokens = 0.0
+        self.last_refill = time.monotonic()
+        if rate_limit:
+            workers = max(1, workers)
+            per_minute = float(rate_limit["requests_per_minute"])
+            burst = float(rate_limit.get("burst", per_minute))
+            self.capacity = max(1.0, burst / workers)
+            self.refill_rate = per_minute / workers / 60
+            self.tokens = self.capacity
+        self._lock = _Lock()
+
+    def is_available(self, now: Optional[float] = None) -> bool:
         """Check if client is available (enabled and not in cooldown)."""
-        return self.enabled and time.time() >= self.available_after
+        return self.enabled and (time.time() if now is None else now) >= self.available_after
 
     def mark_failure(self) -> None:
         """Mark failure with exponential backoff."""
-        self.fail_count += 1
-        backoff = min(self.MAX_BACKOFF, self.INITIAL_BACKOFF * (2 ** (self.fail_count - 1)))
-        self.available_after = time.time() + backoff
+        with self._lock:
+            self.fail_count += 1
+            backoff = min(self.MAX_BACKOFF, self.INITIAL_BACKOFF * (2 ** (self.fail_count - 1)))
+            self.available_after = time.time() + backoff
 
     def mark_success(self) -> None:
         """Mark success, reset failure state."""
-        self.fail_count = 0
-        self.available_after = 0
-        self.request_count += 1
-        if self.weight < self.DEFAULT_WEIGHT:
-            self.weight = min(self.DEFAULT_WEIGHT, self.weight + self.WEIGHT_RECOVERY)
+        with self._lock:
+            self.fail_count = 0
+            self.available_after = 0
+            self.request_count += 1
+            if self.weight < self.DEFAULT_WEIGHT:
+                self.weight = min(self.DEFAULT_WEIGHT, self.weight + self.WEIGHT_RECOVERY)
+
+    def try_consume(self) -> bool:
+        """Take one rate-limit token, refilling first; False if the bucket is empty."""
+        if self.capacity is None:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate
+            )
+            self.last_refill = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def _refilled_tokens(self) -> float:
+        """Tokens the bucket would hold now, without consuming or updating it."""
+        if self.capacity is None:
+            return float("inf")
+        elapsed = time.monotonic() - self.last_refill
+        return min(self.capacity, self.tokens + elapsed * self.refill_rate)
+
+    def refill_wait(self) -> float:
+        """Seconds until the bucket holds a whole token (0 if unlimited or ready)."""
+        missing = 1 - self._refilled_tokens()
+        return missing / self.refill_rate if missing > 0 and self.refill_rate else 0.0
+
+    def start_request(self) -> None:
+        """Count a request dispatched to this client."""
+        with self._lock:
+            self.in_flight += 1
 
-    def get_status(self) -> Dict[str, Any]:
+    def finish_request(self) -> None:
+        """Stop counting a request dispatched to this client."""
+        with self._lock:
+            self.in_flight -= 1
+
+    def reset(self) -> None:
+        """Clear failure state and restore the default weight."""
+        with self._lock:
+            self.fail_count = 0
+            self.available_after = 0
+            self.weight = self.DEFAULT_WEIGHT
+
+    def get_status(self, now: Optional[float] = None) -> Dict[str, Any]:
         """Get current status."""
+        available = self.is_available(now)
         return {
             "id": self.id,
-            "available": self.is_available(),
+            "available": available,
             "enabled": self.enabled,
             "state": self.state,
             "weight": self.weight,
             "fail_count": self.fail_count,
             "request_count": self.request_count,
+            "in_flight": self.in_flight,
+            "tokens": None if self.capacity is None else round(self._refilled_tokens(), 2),
             "next_available_at": (
-                datetime.fromtimestamp(self.available_after, tz=timezone.utc).isoformat()
-                if not self.is_available()
-                else None
+                _format_utc(int(self.available_after)) if not available else None
             ),
         }
 
@@ -73,12 +218,29 @@ class ClientWrapper:
 class ClientPool:
     """Pool of Client instances with weighted round-robin load balancing."""
 
-    def __init__(self, config_path: Optional[str] = None):
+    STATUS_TTL = 0.1  # seconds a get_status snapshot may be reused
+
+    def __init__(self, config_path: Optional[str] = None, workers: int = 1):
         self.clients: Dict[str, ClientWrapper] = {}
         self._rotation_order: List[str] = []
-        self._index = 0
-        self._lock = threading.Lock()
+        # Immutable view of the rotation, swapped atomically by writers so that
+        # get_client can read it without taking the pool lock.
+        self._snapshot: Tuple[ClientWrapper, ...] = ()
+        # Enabled clients grouped into weight tiers (heaviest first), each a ring
+        # buffer. Rebuilt only when membership, enabled state or a weight changes.
+        self._schedule: Tuple[Deque[ClientWrapper], ...] = ()
+        self._lock = _ShardedRWLock()
+        # (available_after, client_id) for clients in backoff; stale entries are
+        # skipped lazily when the entry no longer matches the wrapper.
+        self._cooldown_heap: List[Tuple[float, str]] = []
+        self._heap_lock = _Lock()
+        self._status_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+        # Removed clients whose open async sessions still need closing
+        self._retired: List[ClientWrapper] = []
+        self._rate_limit: Optional[Dict[str, Any]] = None
         self._mode = "anonymous"
+        # Number of processes sharing each client's rate limit
+        self._workers = workers
         self._initialize(config_path)
 
     def _initialize(self, config_path: Optional[str] = None) -> None:
@@ -109,10 +271,7 @@ class ClientPool:
         if csrf and session:
             self._add_client_internal(
                 "default",
-                {
-                    "next-auth.csrf-token": csrf,
-                    "__Secure-next-auth.session-token": session,
-                },
+                {CSRF_KEY: csrf, SESSION_KEY: session},
             )
             self._mode = "single"
             return
@@ -122,128 +281,231 @@ class ClientPool:
 
     def _load_from_config(self, config_path: str) -> None:
         """Load clients from JSON config."""
-        with open(config_path, "r", encoding="utf-8") as f:
-            config = json.load(f)
+        config = _json_loads(pathlib.Path(config_path).read_bytes())
+        self._rate_limit = config.get("rate_limit")
 
         for token in config.get("tokens", []):
-            cookies = {
-                "next-auth.csrf-token": token["csrf_token"],
-                "__Secure-next-auth.session-token": token["session_token"],
-            }
-            self._add_client_internal(token["id"], cookies)
+            cookies = {CSRF_KEY: token["csrf_token"], SESSION_KEY: token["session_token"]}
+            self._add_client_internal(
+                token["id"], cookies, token.get("rate_limit", self._rate_limit)
+            )
         self._mode = "pool"
 
-    def _add_client_internal(self, client_id: str, cookies: Dict) -> None:
+    def _add_client_internal(
+        self, client_id: str, cookies: Dict, rate_limit: Optional[Dict[str, Any]] = None
+    ) -> None:
         """Add client without locking."""
         client = Client(cookies)
-        wrapper = ClientWrapper(client, client_id)
+        wrapper = ClientWrapper(client, client_id, rate_limit, self._workers)
         self.clients[client_id] = wrapper
         self._rotation_order.append(client_id)
-
-    def get_client(self) -> Tuple[Optional[str], Optional[Client]]:
-        """Get next available client using weighted round-robin."""
-        with self._lock:
-            if not self.clients:
-                return None, None
-
-            available = [
-                self.clients[cid]
-                for cid in self._rotation_order
-                if self.clients[cid].is_available()
-            ]
-
-            if available:
-                max_weight = max(w.weight for w in available)
-                top = [w for w in available if w.weight == max_weight]
-
-                if len(top) == 1:
-                    return top[0].id, top[0].client
-
-                # Round-robin among equal weight clients
-                top_ids = {w.id for w in top}
-                for _ in range(len(self._rotation_order)):
-                    cid = self._rotation_order[self._index]
-                    self._index = (self._index + 1) % len(self._rotation_order)
-                    if cid in top_ids:
-                        return cid, self.clients[cid].client
-
-            # No available - return soonest
-            soonest = min(self.clients.values(), key=lambda w: w.available_after)
-            return soonest.id, None
+        self._rebuild_snapshot()
+        self._status_cache = None
+
+    def _rebuild_snapshot(self) -> None:
+        """Publish a fresh rotation snapshot and schedule (caller holds the lock)."""
+        snapshot = tuple(self.clients[cid] for cid in self._rotation_order)
+        enabled = sorted((w for w in snapshot if w.enabled), key=lambda w: -w.weight)
+        self._schedule = tuple(
+            deque(tier) for _, tier in itertools.groupby(enabled, key=lambda w: w.weight)
+        )
+        self._snapshot = snapshot
+
+    def get_client(self) -> Tuple[str, Client]:
+        """Get the available client with the fewest in-flight requests.
+
+        Only the highest weight tier with an available client is considered;
+        ties on in-flight count are broken round-robin, and clients whose
+        rate-limit bucket is empty are skipped. Raises PoolRateLimitedError if
+        every available client is out of tokens, otherwise NoClientAvailableError
+        carrying the id of the client that leaves backoff soonest.
+        """
+        snapshot, schedule = self._snapshot, self._schedule
+        if not snapshot:
+            raise NoClientAvailableError()
+
+        # The availability test is ClientWrapper.is_available inlined for the hot path.
+        now = time.time()
+        throttled: List[ClientWrapper] = []
+        for ring in schedule:
+            ring.rotate(-1)
+            candidates = [w for w in tuple(ring) if w.enabled and now >= w.available_after]
+            # Stable sort keeps ring order among equally loaded clients
+            candidates.sort(key=lambda w: w.in_flight)
+            for wrapper in candidates:
+                if wrapper.try_consume():
+                    return wrapper.id, wrapper.client
+            throttled += candidates
+
+        # Available but out of tokens - report the soonest refill
+        if throttled:
+            waits = [(w.refill_wait(), w.id) for w in throttled]
+            retry_after, client_id = min(waits)
+            raise PoolRateLimitedError(client_id, retry_after)
+
+        # No available - return soonest
+        with self._heap_lock:
+            heap = self._cooldown_heap
+            while heap:
+                available_after, client_id = heap[0]
+                cooling = self.clients.get(client_id)
+                if cooling is not None and cooling.available_after == available_after:
+                    raise NoClientAvailableError(client_id)
+                heapq.heappop(heap)
+
+        soonest = min(snapshot, key=lambda w: w.available_after)
+        raise NoClientAvailableError(soonest.id)
+
+    @contextmanager
+    def track_request(self, client_id: str) -> Iterator[None]:
+        """Count the enclosed upstream call as in flight on client_id."""
+        wrapper = self.clients.get(client_id)
+        if wrapper is None:
+            yield
+            return
+        wrapper.start_request()
+        try:
+            yield
+        finally:
+            wrapper.finish_request()
+
+    async def aclose(self) -> None:
+        """Close the async HTTP sessions held by every client, removed ones included."""
+        with self._lock.write():
+            retired, self._retired = self._retired, []
+        for wrapper in self._snapshot + tuple(retired):
+            await wrapper.client.aclose()
+
+    async def close_retired(self) -> None:
+        """Close the async sessions of removed clients with no request in flight.
+
+        Clients still serving a request stay queued for the next call (or aclose).
+        """
+        with self._lock.write():
+            retired, self._retired = self._retired, []
+        busy = []
+        for wrapper in retired:
+            if wrapper.in_flight:
+                busy.append(wrapper)
+            else:
+                await wrapper.client.aclose()
+        if busy:
+            with self._lock.write():
+                self._retired.extend(busy)
 
     def mark_success(self, client_id: str) -> None:
         """Mark client as successful."""
-        with self._lock:
-            if client_id in self.clients:
-                self.clients[client_id].mark_success()
+        wrapper = self.clients.get(client_id)
+        if wrapper is not None:
+            weight = wrapper.weight
+            wrapper.mark_success()
+            if wrapper.weight != weight:
+                with self._lock.write():
+                    self._rebuild_snapshot()
+            self._status_cache = None
 
     def mark_failure(self, client_id: str) -> None:
         """Mark client as failed."""
-        with self._lock:
-            if client_id in self.clients:
-                self.clients[client_id].mark_failure()
+        wrapper = self.clients.get(client_id)
+        if wrapper is not None:
+            wrapper.mark_failure()
+            with self._heap_lock:
+                heap = self._cooldown_heap
+                if len(heap) >= 2 * len(self.clients):
+                    # Compact stale entries so the heap stays O(clients)
+                    now = time.time()
+                    heap[:] = [
+                        (w.available_after, w.id)
+                        for w in self._snapshot
+                        if w.available_after > now and w is not wrapper
+                    ]
+                    heapq.heapify(heap)
+                heapq.heappush(heap, (wrapper.available_after, client_id))
+            self._status_cache = None
 
     def get_status(self) -> Dict[str, Any]:
-        """Get pool status."""
-        with self._lock:
-            return {
-                "total": len(self.clients),
-                "available": sum(1 for w in self.clients.values() if w.is_available()),
+        """Get pool status, reusing a snapshot younger than STATUS_TTL."""
+        now = time.monotonic()
+        cached = self._status_cache
+        if cached is not None and now - cached[0] < self.STATUS_TTL:
+            return cached[1]
+
+        wall_now = time.time()
+        with self._lock.read():
+            clients = [w.get_status(wall_now) for w in self.clients.values()]
+            status = {
+                "total": len(clients),
+                "available": sum(1 for c in clients if c["available"]),
                 "mode": self._mode,
-                "clients": [w.get_status() for w in self.clients.values()],
+                "clients": clients,
             }
+        self._status_cache = (now, status)
+        return status
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Get client counts only, read lock-free from the rotation snapshot."""
+        snapshot = self._snapshot
+        now = time.time()
+        return {
+            "total": len(snapshot),
+            "available": sum(1 for w in snapshot if w.enabled and now >= w.available_after),
+            "mode": self._mode,
+        }
 
     def add_client(self, client_id: str, csrf_token: str, session_token: str) -> Dict:
         """Add a new client at runtime."""
-        with self._lock:
+        with self._lock.write():
             if client_id in self.clients:
                 return {"status": "error", "message": f"Client '{client_id}' exists"}
-            cookies = {
-                "next-auth.csrf-token": csrf_token,
-                "__Secure-next-auth.session-token": session_token,
-            }
-            self._add_client_internal(client_id, cookies)
+            cookies = {CSRF_KEY: csrf_token, SESSION_KEY: session_token}
+            self._add_client_internal(client_id, cookies, self._rate_limit)
             return {"status": "ok", "message": f"Client '{client_id}' added"}
 
     def remove_client(self, client_id: str) -> Dict:
         """Remove a client at runtime."""
-        with self._lock:
+        with self._lock.write():
             if client_id not in self.clients:
                 return {"status": "error", "message": f"Client '{client_id}' not found"}
             if len(self.clients) <= 1:
                 return {"status": "error", "message": "Cannot remove last client"}
-            del self.clients[client_id]
+            removed = self.clients.pop(client_id)
+            # Only clients that opened an async session need closing later
+            if removed.client.has_async_session:
+                self._retired.append(removed)
             self._rotation_order.remove(client_id)
-            if self._index >= len(self._rotation_order):
-                self._index = 0
+            self._rebuild_snapshot()
+            self._status_cache = None
             return {"status": "ok", "message": f"Client '{client_id}' removed"}
 
     def enable_client(self, client_id: str) -> Dict:
         """Enable a client."""
-        with self._lock:
+        with self._lock.write():
             if client_id not in self.clients:
                 return {"status": "error", "message": f"Client '{client_id}' not found"}
             self.clients[client_id].enabled = True
+            self._rebuild_snapshot()
+            self._status_cache = None
             return {"status": "ok", "message": f"Client '{client_id}' enabled"}
 
     def disable_client(self, client_id: str) -> Dict:
         """Disable a client."""
-        with self._lock:
+        with self._lock.write():
             if client_id not in self.clients:
                 return {"status": "error", "message": f"Client '{client_id}' not found"}
             enabled_count = sum(1 for w in self.clients.values() if w.enabled)
             if enabled_count <= 1:
                 return {"status": "error", "message": "Cannot disable last enabled client"}
             self.clients[client_id].enabled = False
+            self._rebuild_snapshot()
+            self._status_cache = None
             return {"status": "ok", "message": f"Client '{client_id}' disabled"}
 
     def reset_client(self, client_id: str) -> Dict:
         """Reset client failure state."""
-        with self._lock:
+        with self._lock.write():
             if client_id not in self.clients:
                 return {"status": "error", "message": f"Client '{client_id}' not found"}
-            wrapper = self.clients[client_id]
-            wrapper.fail_count = 0
-            wrapper.available_after = 0
-            wrapper.weight = ClientWrapper.DEFAULT_WEIGHT
+            self.clients[client_id].reset()
+            self._rebuild_snapshot()
+            self._status_cache = None
             return {"status": "ok", "message": f"Client '{client_id}' reset"}
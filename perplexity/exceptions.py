@@ -82,3 +82,19 @@ class ValidationError(PerplexityError):
     """Raised when input validation fails."""
 
     pass
+
+
+class NoClientAvailableError(PerplexityError):
+    """Raised when every client in the pool is disabled, cooling down or rate limited."""
+
+    def __init__(self, client_id=None, message="No available clients"):
+        super().__init__(message)
+        self.client_id = client_id  # the client that leaves backoff soonest, if any
+
+
+class PoolRateLimitedError(NoClientAvailableError):
+    """Raised when usable clients exist but all of their rate-limit buckets are empty."""
+
+    def __init__(self, client_id=None, retry_after=0.0):
+        super().__init__(client_id, "All clients are rate limited")
+        self.retry_after = retry_after  # seconds until the soonest bucket refills a token
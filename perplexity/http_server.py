@@ -3,168 +3,309 @@ FastAPI-based HTTP server for Perplexity API with load balancing.
 Provides RESTful endpoints for search and pool management.
 """
 
+import hmac
+import json
+import math
 import os
-from typing import Any, Dict, List, Optional
+from contextlib import ExitStack, asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
 
-from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-# 加载 .env 文件（必须在导入 client_pool 前执行，以便环境变量生效）
-load_dotenv()
+from .client import Client
+from .client_pool import ClientPool
+from .exceptions import NoClientAvailableError, PoolRateLimitedError
 
-from fastapi import Depends, FastAPI, Header, HTTPException  # noqa: E402
-from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
-from pydantic import BaseModel  # noqa: E402
+try:
+    from orjson import dumps as _orjson_dumps
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    _orjson_dumps = None  # type: ignore[assignment]
 
-from .client_pool import ClientPool  # noqa: E402
 
 # ==================== 配置 ====================
-CONFIG = {
-    "host": os.getenv("PPLX_HOST", "0.0.0.0"),  # nosec B104
-    "port": int(os.getenv("PPLX_PORT", "8000")),
-    "api_token": os.getenv("PPLX_API_TOKEN", "sk-123456"),
-    "admin_token": os.getenv("PPLX_ADMIN_TOKEN", ""),
-}
+class _Config(NamedTuple):
+    """Server settings, read from the environment by create_app()."""
+
+    host: str
+    port: int
+    api_token: str
+    admin_token: str
+    max_inflight: int
+    workers: int
+    cors_origins: Tuple[str, ...]
+
+
+def _load_config() -> _Config:
+    """Build the server settings from PPLX_* environment variables."""
+    return _Config(
+        host=os.getenv("PPLX_HOST", "0.0.0.0"),  # nosec B104
+        port=int(os.getenv("PPLX_PORT", "8000")),
+        api_token=os.getenv("PPLX_API_TOKEN", "sk-123456"),
+        admin_token=os.getenv("PPLX_ADMIN_TOKEN", ""),
+        max_inflight=int(os.getenv("PPLX_MAX_INFLIGHT", "64")),
+        workers=int(os.getenv("PPLX_WORKERS", "1")),
+        # 未配置或为空时回退为 "*"
+        cors_origins=tuple(
+            o.strip() for o in os.getenv("PPLX_CORS_ORIGINS", "").split(",") if o.strip()
+        )
+        or ("*",),
+    )
+
+
+# ==================== 响应类与生命周期 ====================
+class OrjsonResponse(JSONResponse):
+    """JSONResponse rendered by orjson (compact UTF-8, like the stdlib one)."""
+
+    def render(self, content: Any) -> bytes:
+        return _orjson_dumps(content)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Build the shared ClientPool once, before the first request is served."""
+    # ClientPool 自行解析 PPLX_TOKEN_POOL_CONFIG 与默认的 token_pool_config.json
+    pool = ClientPool(workers=app.state.config.workers)
+    app.state.pool = pool
+    yield
+    await pool.aclose()
+
+
+router = APIRouter()
+
+
+# ==================== 并发上限 ====================
+class InflightLimitMiddleware:
+    """Answer 429 instead of queueing once max_inflight requests are in progress.
+
+    Pure ASGI, so a request counts until its whole body (including a streamed
+    one) has been sent, not just until the response headers go out.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.inflight = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] == "/health":
+            await self.app(scope, receive, send)
+            return
+        if self.inflight >= scope["app"].state.config.max_inflight:
+            response = JSONResponse(
+                {"detail": "Server busy, retry later"},
+                status_code=429,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+        self.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.inflight -= 1
 
-# ==================== FastAPI App ====================
-app = FastAPI(
-    title="Perplexity API Proxy",
-    description="HTTP API with load balancing for Perplexity AI",
-    version="1.0.0",
-)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
 # ==================== 全局 ClientPool ====================
-_pool: Optional[ClientPool] = None
+async def get_pool(request: Request) -> ClientPool:
+    """Return the ClientPool created by the app lifespan."""
+    pool: ClientPool = request.app.state.pool
+    return pool
 
 
-def get_pool() -> ClientPool:
-    """Get or create the singleton ClientPool instance."""
-    global _pool
-    if _pool is None:
-        config_path = os.getenv("PPLX_TOKEN_POOL_CONFIG", "token_pool_config.json")
-        _pool = ClientPool(config_path if os.path.exists(config_path) else None)
-    return _pool
+def _acquire_client(pool: ClientPool) -> Tuple[str, Client]:
+    """Pick a client, answering 429 when the pool is throttled and 503 when it is down."""
+    try:
+        return pool.get_client()
+    except PoolRateLimitedError as e:
+        raise HTTPException(
+            status_code=429,
+            detail="All clients are rate limited, retry later",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+    except NoClientAvailableError:
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "message": "No available clients",
+                "pool_status": pool.get_status(),
+            },
+        )
 
 
 def _extract_clean_result(response: Dict[str, Any]) -> Dict[str, Any]:
     """Extract the final answer and source links from the search response."""
-    result = {}
-
-    # 提取最终答案
-    if "answer" in response:
-        result["answer"] = response["answer"]
-    else:
-        result["answer"] = ""
+    result = {"answer": response.get("answer", "")}
 
     # 提取来源链接
-    sources = []
-
-    # 方法1: 从 text 字段的 SEARCH_RESULTS 步骤中提取 web_results
-    if "text" in response and isinstance(response["text"], list):
-        for step in response["text"]:
-            if isinstance(step, dict) and step.get("step_type") == "SEARCH_RESULTS":
-                content = step.get("content", {})
-                web_results = content.get("web_results", [])
-                for web_result in web_results:
-                    if isinstance(web_result, dict) and "url" in web_result:
-                        source = {"url": web_result["url"]}
-                        if "name" in web_result:
-                            source["title"] = web_result["name"]
-                        if "snippet" in web_result:
-                            source["snippet"] = web_result["snippet"]
-                        sources.append(source)
+    sources: List[Dict[str, Any]] = []
+    append = sources.append
+
+    # 方法1: 从 text 字段的 SEARCH_RESULTS 步骤中提取 web_results（FINAL 为最后一步）
+    steps = response.get("text")
+    if isinstance(steps, list):
+        for step in steps:
+            try:
+                step_type = step["step_type"]
+                if step_type != "SEARCH_RESULTS":
+                    if step_type == "FINAL":
+                        break
+                    continue
+                web_results = step["content"]["web_results"]
+            except (TypeError, KeyError):
+                continue
+            for web_result in web_results:
+                try:
+                    source = {"url": web_result["url"]}
+                except (TypeError, KeyError):
+                    continue
+                # 空标题/摘要不输出，减小响应体
+                title = web_result.get("name")
+                if title:
+                    source["title"] = title
+                snippet = web_result.get("snippet")
+                if snippet:
+                    source["snippet"] = snippet
+                append(source)
 
     # 方法2: 备用 - 从 chunks 字段提取（如果 chunks 包含 URL）
-    if not sources and "chunks" in response and isinstance(response["chunks"], list):
-        for chunk in response["chunks"]:
-            if isinstance(chunk, dict):
-                source = {}
-                if "url" in chunk:
-                    source["url"] = chunk["url"]
-                if "title" in chunk:
-                    source["title"] = chunk["title"]
-                if "name" in chunk and "title" not in source:
-                    source["title"] = chunk["name"]
-                if "url" in source:
-                    sources.append(source)
+    if not sources:
+        for chunk in response.get("chunks") or ():
+            try:
+                source = {"url": chunk["url"]}
+            except (TypeError, KeyError):
+                continue
+            title = chunk.get("title") or chunk.get("name")
+            if title:
+                source["title"] = title
+            append(source)
 
     result["sources"] = sources
 
     return result
 
 
+def _sse(event: str, data: Dict[str, Any]) -> bytes:
+    """Encode one server-sent event."""
+    if _orjson_dumps is not None:
+        payload = _orjson_dumps(data)
+    else:
+        payload = json.dumps(data, ensure_ascii=False).encode()
+    return b"event: " + event.encode() + b"\ndata: " + payload + b"\n\n"
+
+
+async def _stream_search(
+    pool: ClientPool,
+    client_id: str,
+    partials: AsyncGenerator[Dict[str, Any], None],
+    tracking: ExitStack,
+) -> AsyncIterator[bytes]:
+    """Relay partial search responses as SSE: new sources as they appear, then the answer.
+
+    The answer is only decoded from the upstream FINAL step, so it arrives once,
+    at the end. tracking holds the in-flight count started by the handler and is
+    released once the stream is done.
+    """
+    sent_sources = 0
+    answer = ""
+    try:
+        async for partial in partials:
+            clean = _extract_clean_result(partial)
+            sources = clean["sources"]
+            if len(sources) > sent_sources:
+                yield _sse("sources", {"web_results": sources[sent_sources:]})
+                sent_sources = len(sources)
+            if clean["answer"] and clean["answer"] != answer:
+                answer = clean["answer"]
+                yield _sse("answer", {"answer": answer})
+    except Exception as e:
+        pool.mark_failure(client_id)
+        yield _sse("error", {"detail": str(e)})
+        return
+    finally:
+        await partials.aclose()
+        tracking.close()
+
+    pool.mark_success(client_id)
+    yield _sse("done", {"status": "ok", "client_id": client_id})
+
+
+def _on_generate_image(content: Dict[str, Any], result: Dict[str, Any]) -> None:
+    """Record the prompt and caption from a GENERATE_IMAGE step."""
+    result["prompt_used"] = content.get("prompt", "")
+    result["caption"] = content.get("caption", "")
+
+
+def _on_generate_image_results(content: Dict[str, Any], result: Dict[str, Any]) -> None:
+    """Append the images listed in a GENERATE_IMAGE_RESULTS step."""
+    result["images"].extend(
+        {
+            "url": img.get("url"),
+            "thumbnail_url": img.get("thumbnail_url"),
+            "width": img.get("image_width"),
+            "height": img.get("image_height"),
+        }
+        for img in content.get("image_results") or ()
+    )
+
+
+# text 中各步骤类型对应的处理函数
+_IMAGE_STEP_HANDLERS = {
+    "GENERATE_IMAGE": _on_generate_image,
+    "GENERATE_IMAGE_RESULTS": _on_generate_image_results,
+}
+
+
 def _extract_image_result(response: Dict[str, Any]) -> Dict[str, Any]:
     """Extract generated images from the response."""
-    images = []
-    prompt_used = ""
-    caption = ""
-    model = ""
+    result: Dict[str, Any] = {"images": [], "prompt_used": "", "caption": "", "model": ""}
+    images = result["images"]
 
     # 备用：从 media_items 提取
-    if "media_items" in response:
-        for item in response.get("media_items", []):
-            if item.get("medium") == "image":
-                images.append(
-                    {
-                        "url": item.get("image"),
-                        "thumbnail_url": item.get("thumbnail"),
-                        "width": item.get("image_width"),
-                        "height": item.get("image_height"),
-                    }
-                )
-                caption = item.get("name", "")
-                meta = item.get("generated_media_metadata", {})
-                if not prompt_used:
-                    prompt_used = meta.get("prompt", "")
-                if not model:
-                    model = meta.get("model_str", "")
-
-    if not images and "text" in response and isinstance(response["text"], list):
-        for step in response["text"]:
-            if step.get("step_type") == "GENERATE_IMAGE":
-                content = step.get("content", {})
-                prompt_used = content.get("prompt", "")
-                caption = content.get("caption", "")
-
-            elif step.get("step_type") == "GENERATE_IMAGE_RESULTS":
-                content = step.get("content", {})
-                for img in content.get("image_results", []):
-                    images.append(
-                        {
-                            "url": img.get("url"),
-                            "thumbnail_url": img.get("thumbnail_url"),
-                            "width": img.get("image_width"),
-                            "height": img.get("image_height"),
-                        }
-                    )
-    return {
-        "images": images,
-        "prompt_used": prompt_used,
-        "caption": caption,
-        "model": model,
-    }
+    for item in response.get("media_items") or ():
+        if item.get("medium") == "image":
+            images.append(
+                {
+                    "url": item.get("image"),
+                    "thumbnail_url": item.get("thumbnail"),
+                    "width": item.get("image_width"),
+                    "height": item.get("image_height"),
+                }
+            )
+            result["caption"] = item.get("name", "")
+            meta = item.get("generated_media_metadata", {})
+            if not result["prompt_used"]:
+                result["prompt_used"] = meta.get("prompt", "")
+            if not result["model"]:
+                result["model"] = meta.get("model_str", "")
+
+    # 单次遍历 text，按 step_type 分派
+    steps = response.get("text")
+    if not images and isinstance(steps, list):
+        for step in steps:
+            handler = _IMAGE_STEP_HANDLERS.get(step.get("step_type"))
+            if handler is not None:
+                handler(step.get("content") or {}, result)
+
+    return result
 
 
 # ==================== 认证依赖 ====================
-async def verify_api_token(authorization: str = Header(None)):
+async def verify_api_token(request: Request, authorization: str = Header(None)):
     """Verify API token from Authorization header."""
-    expected = f"Bearer {CONFIG['api_token']}"
-    if authorization != expected:
+    expected = request.app.state.expected_auth
+    if authorization is None or not hmac.compare_digest(authorization.encode(), expected):
         raise HTTPException(status_code=401, detail="Invalid or missing API token")
 
 
-async def verify_admin_token(x_admin_token: str = Header(None)):
+async def verify_admin_token(request: Request, x_admin_token: str = Header(None)):
     """Verify admin token from X-Admin-Token header."""
-    if not CONFIG["admin_token"]:
+    expected = request.app.state.expected_admin
+    if not expected:
         raise HTTPException(status_code=403, detail="Admin token not configured")
-    if x_admin_token != CONFIG["admin_token"]:
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), expected):
         raise HTTPException(status_code=401, detail="Invalid admin token")
 
 
@@ -172,17 +313,22 @@ async def verify_admin_token(x_admin_token: str = Header(None)):
 class SearchRequest(BaseModel):
     """Search request model."""
 
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     query: str
     mode: str = "auto"
     model: Optional[str] = None
     sources: List[str] = ["web"]
     language: str = "en-US"
     incognito: bool = True
+    stream: bool = False
 
 
 class ClientRequest(BaseModel):
     """Client management request model."""
 
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     id: str
     csrf_token: Optional[str] = None
     session_token: Optional[str] = None
@@ -191,6 +337,8 @@ class ClientRequest(BaseModel):
 class ImageGenerateRequest(BaseModel):
     """Image generation request model."""
 
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     prompt: str
     mode: str = "auto"  # 使用 reasoning 模式触发图片生成
     model: Optional[str] = None
@@ -199,59 +347,49 @@ class ImageGenerateRequest(BaseModel):
 
 
 # ==================== API 端点 ====================
-@app.get("/health")
-async def health_check():
+@router.get("/health")
+async def health_check(pool: ClientPool = Depends(get_pool)):
     """健康检查（无需认证）"""
-    pool = get_pool()
-    status = pool.get_status()
     return {
         "status": "healthy",
         "service": "perplexity-proxy",
-        "pool": {
-            "total": status["total"],
-            "available": status["available"],
-            "mode": status["mode"],
-        },
+        "pool": pool.get_summary(),
     }
 
 
-@app.get("/pool/status")
-async def pool_status():
+@router.get("/pool/status")
+async def pool_status(pool: ClientPool = Depends(get_pool)):
     """号池状态（无需认证）"""
-    return get_pool().get_status()
+    return pool.get_status()
 
 
-@app.post("/search", dependencies=[Depends(verify_api_token)])
-async def search(request: SearchRequest):
+@router.post("/search", dependencies=[Depends(verify_api_token)])
+async def search(request: SearchRequest, pool: ClientPool = Depends(get_pool)):
     """
     执行搜索查询（需要 API Token）
 
     使用负载均衡从池中选择可用客户端
     """
-    pool = get_pool()
-    client_id, client = pool.get_client()
-
-    if client is None:
-        status = pool.get_status()
-        raise HTTPException(
-            status_code=503,
-            detail={
-                "message": "No available clients",
-                "pool_status": status,
-            },
-        )
+    client_id, client = _acquire_client(pool)
 
     try:
-        response = client.search(
-            query="帮我生成一幅图片:" + request.query,
-            mode=request.mode,
-            model=request.model,
-            sources=request.sources,
-            language=request.language,
-            stream=False,
-            incognito=request.incognito,
-        )
-        assert client_id is not None  # client_id must be set if client is not None
+        with ExitStack() as tracking:
+            tracking.enter_context(pool.track_request(client_id))
+            response = await client.asearch(
+                query=request.query,
+                mode=request.mode,
+                model=request.model,
+                sources=request.sources,
+                language=request.language,
+                stream=request.stream,
+                incognito=request.incognito,
+            )
+            if request.stream:
+                # 流式响应在发送完毕前持续计入 in-flight，由 _stream_search 负责释放
+                return StreamingResponse(
+                    _stream_search(pool, client_id, response, tracking.pop_all()),
+                    media_type="text/event-stream",
+                )
         pool.mark_success(client_id)
 
         # # 保存响应到 JSON 文件以便分析
@@ -273,42 +411,30 @@ async def search(request: SearchRequest):
             "web_results": clean_result["sources"],
         }
     except Exception as e:
-        assert client_id is not None
         pool.mark_failure(client_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/generate-image", dependencies=[Depends(verify_api_token)])
-async def generate_image(request: ImageGenerateRequest):
+@router.post("/generate-image", dependencies=[Depends(verify_api_token)])
+async def generate_image(request: ImageGenerateRequest, pool: ClientPool = Depends(get_pool)):
     """
     生成图片（需要 API Token）
 
     通过 Perplexity 的 reasoning 模式触发图片生成
     """
-    pool = get_pool()
-    client_id, client = pool.get_client()
-
-    if client is None:
-        status = pool.get_status()
-        raise HTTPException(
-            status_code=503,
-            detail={
-                "message": "No available clients",
-                "pool_status": status,
-            },
-        )
+    client_id, client = _acquire_client(pool)
 
     try:
-        response = client.search(
-            query=request.prompt,
-            mode=request.mode,
-            model=request.model,
-            sources=["web"],
-            language=request.language,
-            stream=False,
-            incognito=request.incognito,
-        )
-        assert client_id is not None
+        with pool.track_request(client_id):
+            response = await client.asearch(
+                query=request.prompt,
+                mode=request.mode,
+                model=request.model,
+                sources=["web"],
+                language=request.language,
+                stream=False,
+                incognito=request.incognito,
+            )
         pool.mark_success(client_id)
 
         result = _extract_image_result(response)
@@ -322,56 +448,104 @@ async def generate_image(request: ImageGenerateRequest):
             "model": result["model"],
         }
     except Exception as e:
-        assert client_id is not None
         pool.mark_failure(client_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/pool/list", dependencies=[Depends(verify_api_token)])
-async def list_clients():
+@router.get("/pool/list", dependencies=[Depends(verify_api_token)])
+async def list_clients(pool: ClientPool = Depends(get_pool)):
     """列出所有客户端（需要 API Token）"""
-    return get_pool().get_status()
+    return pool.get_status()
 
 
-@app.post("/pool/add", dependencies=[Depends(verify_admin_token)])
-async def add_client(request: ClientRequest):
+@router.post("/pool/add", dependencies=[Depends(verify_admin_token)])
+async def add_client(request: ClientRequest, pool: ClientPool = Depends(get_pool)):
     """添加客户端（需要 Admin Token）"""
     if not request.csrf_token or not request.session_token:
         raise HTTPException(status_code=400, detail="csrf_token and session_token are required")
-    return get_pool().add_client(request.id, request.csrf_token, request.session_token)
+    return pool.add_client(request.id, request.csrf_token, request.session_token)
 
 
-@app.post("/pool/remove", dependencies=[Depends(verify_admin_token)])
-async def remove_client(request: ClientRequest):
+@router.post("/pool/remove", dependencies=[Depends(verify_admin_token)])
+async def remove_client(request: ClientRequest, pool: ClientPool = Depends(get_pool)):
     """移除客户端（需要 Admin Token）"""
-    return get_pool().remove_client(request.id)
+    result = pool.remove_client(request.id)
+    await pool.close_retired()
+    return result
 
 
-@app.post("/pool/enable", dependencies=[Depends(verify_admin_token)])
-async def enable_client(request: ClientRequest):
+@router.post("/pool/enable", dependencies=[Depends(verify_admin_token)])
+async def enable_client(request: ClientRequest, pool: ClientPool = Depends(get_pool)):
     """启用客户端（需要 Admin Token）"""
-    return get_pool().enable_client(request.id)
+    return pool.enable_client(request.id)
 
 
-@app.post("/pool/disable", dependencies=[Depends(verify_admin_token)])
-async def disable_client(request: ClientRequest):
+@router.post("/pool/disable", dependencies=[Depends(verify_admin_token)])
+async def disable_client(request: ClientRequest, pool: ClientPool = Depends(get_pool)):
     """禁用客户端（需要 Admin Token）"""
-    return get_pool().disable_client(request.id)
+    return pool.disable_client(request.id)
 
 
-@app.post("/pool/reset", dependencies=[Depends(verify_admin_token)])
-async def reset_client(request: ClientRequest):
+@router.post("/pool/reset", dependencies=[Depends(verify_admin_token)])
+async def reset_client(request: ClientRequest, pool: ClientPool = Depends(get_pool)):
     """重置客户端状态（需要 Admin Token）"""
-    return get_pool().reset_client(request.id)
+    return pool.reset_client(request.id)
+
+
+# ==================== FastAPI App ====================
+def create_app() -> FastAPI:
+    """Build the app from the current environment (PPLX_* variables)."""
+    config = _load_config()
+    app = FastAPI(
+        title="Perplexity API Proxy",
+        description="HTTP API with load balancing for Perplexity AI",
+        version="1.0.0",
+        lifespan=lifespan,
+        default_response_class=OrjsonResponse if _orjson_dumps is not None else JSONResponse,
+    )
+    app.state.config = config
+    # Expected auth header values, built once instead of per request
+    app.state.expected_auth = f"Bearer {config.api_token}".encode()
+    app.state.expected_admin = config.admin_token.encode()
+
+    app.include_router(router)
+    app.add_middleware(InflightLimitMiddleware)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=config.cors_origins,
+        # 通配来源时不携带凭证，Starlette 可直接返回静态的 "*" 头
+        allow_credentials="*" not in config.cors_origins,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    return app
+
+
+# 供 `uvicorn perplexity.http_server:app` 直接使用；main() 在加载 .env 后通过 create_app 构建
+app = create_app()
 
 
 # ==================== 入口点 ====================
 def main():
     """Run the HTTP server."""
     import uvicorn
-
-    print(f"Starting Perplexity API Proxy on {CONFIG['host']}:{CONFIG['port']}")
-    uvicorn.run(app, host=CONFIG["host"], port=CONFIG["port"])
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    config = _load_config()
+    print(
+        f"Starting Perplexity API Proxy on {config.host}:{config.port} "
+        f"({config.workers} worker(s))"
+    )
+    # 每个 worker 调用 create_app，按已加载 .env 的环境构建配置
+    # loop/http 默认 "auto"：安装了 uvloop / httptools 时自动启用
+    uvicorn.run(
+        "perplexity.http_server:create_app",
+        factory=True,
+        host=config.host,
+        port=config.port,
+        workers=config.workers,
+    )
 
 
 if __name__ == "__main__":
@@ -5,6 +5,7 @@ This module provides helper functions for retry logic, validation,
 and other common operations.
 """
 
+import json
 import random
 import time
 from functools import wraps
@@ -22,6 +23,11 @@ from .config import (
 from .exceptions import ValidationError
 from .logger import get_logger
 
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # orjson is optional; its JSONDecodeError subclasses json's
+    from json import loads as _json_loads  # type: ignore[assignment]
+
 logger = get_logger("utils")
 
 
@@ -282,11 +288,9 @@ def parse_nested_json_response(content_json: dict) -> dict:
         >>> response = parse_nested_json_response(api_response)
         >>> print(response['answer'])
     """
-    import json
-
     if "text" in content_json and content_json["text"]:
         try:
-            text_parsed = json.loads(content_json["text"])
+            text_parsed = _json_loads(content_json["text"])
 
             if isinstance(text_parsed, list):
                 for step in text_parsed:
@@ -295,7 +299,7 @@ def parse_nested_json_response(content_json: dict) -> dict:
 
                         if "answer" in final_content:
                             try:
-                                answer_data = json.loads(final_content["answer"])
+                                answer_data = _json_loads(final_content["answer"])
                                 content_json["answer"] = answer_data.get("answer", "")
                                 content_json["chunks"] = answer_data.get("chunks", [])
                             except (json.JSONDecodeError, TypeError):
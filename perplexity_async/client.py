@@ -248,7 +248,6 @@ class Client(AsyncMixin):
         }
 
         resp = await self.session.post(ENDPOINT_SSE_ASK, json=json_data, stream=True)
-        chunks = []
 
         async def stream_response(resp):
             async for chunk in resp.aiter_lines(delimiter=b"\r\n\r\n"):
@@ -280,8 +279,7 @@ class Client(AsyncMixin):
                             except (json.JSONDecodeError, TypeError, KeyError):
                                 pass
 
-                        chunks.append(content_json)
-                        yield chunks[-1]
+                        yield content_json
                     except (json.JSONDecodeError, KeyError):
                         continue
 
@@ -291,6 +289,8 @@ class Client(AsyncMixin):
         if stream:
             return stream_response(resp)
 
+        # Each message carries the full response so far, so only the latest is kept
+        last = {}
         async for chunk in resp.aiter_lines(delimiter=b"\r\n\r\n"):
             content = chunk.decode("utf-8")
 
@@ -316,9 +316,9 @@ class Client(AsyncMixin):
                         except (json.JSONDecodeError, TypeError, KeyError):
                             pass
 
-                    chunks.append(content_json)
+                    last = content_json
                 except (json.JSONDecodeError, KeyError):
                     continue
 
             elif content.startswith("event: end_of_stream\r\n"):
-                return chunks[-1] if chunks else {}
+                return last
@@ -11,6 +11,8 @@ import os
 BASE_URL = os.getenv("PPLX_HOST_URL", "http://localhost:8000")
 # 从环境变量获取 Token，避免硬编码泄露
 API_TOKEN = os.getenv("PPLX_API_TOKEN", "sk-123") 
+# 复用 keep-alive 连接，避免每个请求重新握手
+SESSION = requests.Session()
 
 
 def print_result(name: str, response: requests.Response):
@@ -40,7 +42,7 @@ def test_health():
     print("1. 测试健康检查 /health")
     print("="*50)
     
-    resp = requests.get(f"{BASE_URL}/health")
+    resp = SESSION.get(f"{BASE_URL}/health")
     print_result("Health Check", resp)
     return resp.ok
 
@@ -51,7 +53,7 @@ def test_pool_status():
     print("2. 测试号池状态 /pool/status")
     print("="*50)
     
-    resp = requests.get(f"{BASE_URL}/pool/status")
+    resp = SESSION.get(f"{BASE_URL}/pool/status")
     print_result("Pool Status", resp)
     return resp.ok
 
@@ -71,7 +73,7 @@ def test_search():
         "language": "zh-CN"
     }
     
-    resp = requests.post(f"{BASE_URL}/search", json=data, headers=headers)
+    resp = SESSION.post(f"{BASE_URL}/search", json=data, headers=headers)
     print_result("Search", resp)
     return resp.ok
 
@@ -83,7 +85,7 @@ def test_search_without_token():
     print("="*50)
     
     data = {"query": "test"}
-    resp = requests.post(f"{BASE_URL}/search", json=data)
+    resp = SESSION.post(f"{BASE_URL}/search", json=data)
     print_result("Search without token", resp)
     return resp.status_code == 401
 
@@ -95,7 +97,7 @@ def test_pool_list():
     print("="*50)
     
     headers = {"Authorization": f"Bearer {API_TOKEN}"}
-    resp = requests.get(f"{BASE_URL}/pool/list", headers=headers)
+    resp = SESSION.get(f"{BASE_URL}/pool/list", headers=headers)
     print_result("Pool List", resp)
     return resp.ok
 
@@ -114,7 +116,7 @@ def test_generate_image():
         "language": "zh-CN"
     }
     
-    resp = requests.post(f"{BASE_URL}/generate-image", json=data, headers=headers)
+    resp = SESSION.post(f"{BASE_URL}/generate-image", json=data, headers=headers)
     
     # 专门处理图片生成的输出
     status = "✅" if resp.ok else "❌"
@@ -0,0 +1,137 @@
+"""Client SSE decoding tests with console-style output."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from perplexity import client as client_module
+from perplexity.client import Client
+
+
+def _message(payload) -> str:
+    return "event: message\r\ndata: " + json.dumps(payload)
+
+
+def _final_message(answer: str) -> str:
+    steps = [
+        {"step_type": "INITIAL_QUERY", "content": {"query": "q"}},
+        {
+            "step_type": "FINAL",
+            "content": {"answer": json.dumps({"answer": answer, "chunks": ["c"]})},
+        },
+    ]
+    return _message({"status": "COMPLETED", "text": json.dumps(steps)})
+
+
+SSE_BODY = "\r\n\r\n".join(
+    [
+        _message({"status": "PENDING", "text": json.dumps([])}),
+        "event: message\r\ndata: {broken",
+        _final_message("42"),
+        "event: end_of_stream\r\ndata: {}",
+    ]
+).encode()
+
+
+class FakeResponse:
+    """Stand-in for a curl_cffi streaming response over SSE_BODY."""
+
+    status_code = 200
+    ok = True
+
+    def iter_lines(self, delimiter):
+        yield from SSE_BODY.split(delimiter)
+
+    async def aiter_lines(self, delimiter):
+        for chunk in SSE_BODY.split(delimiter):
+            yield chunk
+
+    async def aclose(self):
+        pass
+
+
+class FakeSession:
+    """Stand-in for curl_cffi's Session that answers every call with FakeResponse."""
+
+    def __init__(self, **kwargs):
+        self.cookies = kwargs.get("cookies")
+        self.posted = []
+
+    def get(self, url, **kwargs):
+        return FakeResponse()
+
+    def post(self, url, **kwargs):
+        self.posted.append(kwargs["json"])
+        return FakeResponse()
+
+
+class FakeAsyncSession(FakeSession):
+    """Async counterpart of FakeSession."""
+
+    async def post(self, url, **kwargs):
+        return FakeSession.post(self, url, **kwargs)
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch) -> Client:
+    fake_requests = SimpleNamespace(Session=FakeSession, AsyncSession=FakeAsyncSession)
+    monkeypatch.setattr(client_module, "requests", fake_requests)
+    return Client()
+
+
+def test_parse_message_unpacks_text_and_final_answer() -> None:
+    print("console.log -> decoding an SSE message with a FINAL step")
+    parsed = Client._parse_message(_final_message("42"))
+    assert parsed["answer"] == "42"
+    assert parsed["chunks"] == ["c"]
+    assert [step["step_type"] for step in parsed["text"]] == ["INITIAL_QUERY", "FINAL"]
+
+
+def test_parse_message_rejects_invalid_json() -> None:
+    print("console.log -> skipping undecodable SSE messages")
+    assert Client._parse_message("event: message\r\ndata: {broken") is None
+
+
+def test_parse_message_keeps_non_list_text() -> None:
+    print("console.log -> leaving non-list text without an answer")
+    parsed = Client._parse_message(_message({"text": json.dumps({"step_type": "FINAL"})}))
+    assert parsed["text"] == {"step_type": "FINAL"}
+    assert "answer" not in parsed
+
+    parsed = Client._parse_message(_message({"text": "plain text"}))
+    assert parsed["text"] == "plain text"
+
+
+def test_search_returns_last_message(client: Client) -> None:
+    print("console.log -> keeping only the final message of a buffered search")
+    response = client.search("q")
+    assert response["status"] == "COMPLETED"
+    assert response["answer"] == "42"
+    assert client.session.posted[0]["query_str"] == "q"
+
+
+def test_asearch_returns_last_message(client: Client) -> None:
+    print("console.log -> keeping only the final message of an awaited search")
+
+    async def run():
+        try:
+            return await client.asearch("q")
+        finally:
+            await client.aclose()
+
+    response = asyncio.run(run())
+    assert response["status"] == "COMPLETED"
+    assert response["answer"] == "42"
+
+
+def test_parse_message_keeps_steps_when_final_answer_is_invalid() -> None:
+    print("console.log -> tolerating an undecodable FINAL answer")
+    steps = [{"step_type": "FINAL", "content": {"answer": "{broken"}}]
+    parsed = Client._parse_message(_message({"text": json.dumps(steps)}))
+    assert parsed["text"] == steps
+    assert "answer" not in parsed
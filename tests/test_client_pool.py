@@ -0,0 +1,218 @@
+"""ClientPool selection tests with console-style output."""
+
+import asyncio
+
+import pytest
+
+from perplexity import client_pool
+from perplexity.client_pool import ClientPool
+from perplexity.exceptions import NoClientAvailableError, PoolRateLimitedError
+
+
+class FakeClient:
+    """Stand-in for Client that skips the network handshake."""
+
+    def __init__(self, cookies=None):
+        self.cookies = cookies or {}
+        self.closed = False
+        self.has_async_session = True
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch, tmp_path) -> ClientPool:
+    monkeypatch.setattr(client_pool, "Client", FakeClient)
+    monkeypatch.chdir(tmp_path)
+    for name in ("PPLX_TOKEN_POOL_CONFIG", "PPLX_CSRF_TOKEN", "PPLX_SESSION_TOKEN"):
+        monkeypatch.delenv(name, raising=False)
+    pool = ClientPool()
+    pool.add_client("a", "csrf-a", "session-a")
+    pool.add_client("b", "csrf-b", "session-b")
+    pool.remove_client("anonymous")
+    return pool
+
+
+def test_get_client_round_robins_equal_weights(pool: ClientPool) -> None:
+    print("console.log -> rotating between equal-weight clients")
+    picked = [pool.get_client()[0] for _ in range(4)]
+    assert sorted(picked) == ["a", "a", "b", "b"]
+    assert picked[0] != picked[1]
+
+
+def test_get_client_skips_failed_client(pool: ClientPool) -> None:
+    print("console.log -> skipping clients in backoff")
+    pool.mark_failure("a")
+    assert {pool.get_client()[0] for _ in range(3)} == {"b"}
+
+    pool.mark_failure("b")
+    with pytest.raises(NoClientAvailableError) as exc_info:
+        pool.get_client()
+    assert exc_info.value.client_id == "a"
+
+    pool.reset_client("b")
+    assert pool.get_client()[0] == "b"
+
+
+def test_removed_client_leaves_rotation(pool: ClientPool) -> None:
+    print("console.log -> removing a client at runtime")
+    assert pool.remove_client("a")["status"] == "ok"
+    assert {pool.get_client()[0] for _ in range(3)} == {"b"}
+    assert pool.get_status()["total"] == 1
+
+
+def test_heavier_tier_is_preferred(pool: ClientPool) -> None:
+    print("console.log -> preferring the heaviest available tier")
+    pool.clients["b"].weight = 50
+    pool.enable_client("b")  # republishes the schedule
+    assert {pool.get_client()[0] for _ in range(3)} == {"a"}
+
+    pool.mark_failure("a")
+    assert pool.get_client()[0] == "b"
+
+
+def test_load_from_config_uses_shared_cookie_keys(monkeypatch, tmp_path) -> None:
+    print("console.log -> loading tokens from a JSON config")
+    monkeypatch.setattr(client_pool, "Client", FakeClient)
+    config = tmp_path / "token_pool_config.json"
+    config.write_text(
+        '{"tokens": [{"id": "acc", "csrf_token": "c", "session_token": "s"}]}',
+        encoding="utf-8",
+    )
+    pool = ClientPool(str(config))
+
+    cookies = pool.clients["acc"].client.cookies
+    assert cookies == {client_pool.CSRF_KEY: "c", client_pool.SESSION_KEY: "s"}
+    assert pool.get_status()["mode"] == "pool"
+
+
+def test_get_status_is_cached_until_pool_changes(pool: ClientPool) -> None:
+    print("console.log -> reusing status snapshots between changes")
+    status = pool.get_status()
+    assert pool.get_status() is status
+
+    pool.mark_failure("a")
+    refreshed = pool.get_status()
+    assert refreshed is not status
+    assert refreshed["available"] == 1
+
+
+def test_soonest_client_tracks_repeated_failures(pool: ClientPool) -> None:
+    print("console.log -> reporting the earliest client out of backoff")
+    pool.mark_failure("a")
+    pool.mark_failure("b")
+    pool.mark_failure("a")  # a's backoff doubles, so b now recovers first
+    with pytest.raises(NoClientAvailableError) as exc_info:
+        pool.get_client()
+    assert exc_info.value.client_id == "b"
+
+    for _ in range(10):
+        pool.mark_failure("a")
+    assert len(pool._cooldown_heap) <= 2 * len(pool.clients) + 1
+    with pytest.raises(NoClientAvailableError) as exc_info:
+        pool.get_client()
+    assert exc_info.value.client_id == "b"
+
+
+def test_get_client_prefers_least_in_flight(pool: ClientPool) -> None:
+    print("console.log -> steering away from busy clients")
+    with pool.track_request("a"):
+        assert {pool.get_client()[0] for _ in range(3)} == {"b"}
+        assert pool.clients["a"].in_flight == 1
+    assert pool.clients["a"].in_flight == 0
+    assert {pool.get_client()[0] for _ in range(4)} == {"a", "b"}
+
+
+def test_rate_limited_client_is_skipped(monkeypatch, tmp_path) -> None:
+    print("console.log -> honouring per-client token buckets")
+    monkeypatch.setattr(client_pool, "Client", FakeClient)
+    config = tmp_path / "token_pool_config.json"
+    config.write_text(
+        '{"rate_limit": {"requests_per_minute": 1, "burst": 1}, "tokens": ['
+        '{"id": "a", "csrf_token": "c", "session_token": "s"},'
+        '{"id": "b", "csrf_token": "c", "session_token": "s", "rate_limit": null}]}',
+        encoding="utf-8",
+    )
+    pool = ClientPool(str(config))
+
+    picked = [pool.get_client()[0] for _ in range(4)]
+    assert picked.count("a") == 1
+    assert picked.count("b") == 3
+
+
+def test_rate_limit_is_split_across_workers(monkeypatch, tmp_path) -> None:
+    print("console.log -> sharing the rate budget between uvicorn workers")
+    monkeypatch.setenv("PPLX_WORKERS", "not-a-number")  # the library never reads it
+    wrapper = client_pool.ClientWrapper(
+        FakeClient(), "a", {"requests_per_minute": 60, "burst": 4}, workers=2
+    )
+    assert wrapper.capacity == 2
+    assert wrapper.refill_rate == 0.5
+
+    monkeypatch.setattr(client_pool, "Client", FakeClient)
+    config = tmp_path / "token_pool_config.json"
+    config.write_text(
+        '{"rate_limit": {"requests_per_minute": 60}, "tokens": ['
+        '{"id": "a", "csrf_token": "c", "session_token": "s"}]}',
+        encoding="utf-8",
+    )
+    assert ClientPool(str(config), workers=3).clients["a"].capacity == 20
+
+
+def test_get_summary_matches_status_counts(pool: ClientPool) -> None:
+    print("console.log -> summarising the pool without per-client detail")
+    pool.mark_failure("a")
+    summary = pool.get_summary()
+    assert summary == {"total": 2, "available": 1, "mode": "anonymous"}
+    status = pool.get_status()
+    assert {k: status[k] for k in summary} == summary
+
+
+def test_close_retired_waits_for_in_flight_requests(pool: ClientPool) -> None:
+    print("console.log -> closing sessions of removed clients once idle")
+    removed = pool.clients["a"]
+    with pool.track_request("a"):
+        pool.remove_client("a")
+        asyncio.run(pool.close_retired())
+        assert not removed.client.closed
+    asyncio.run(pool.close_retired())
+    assert removed.client.closed
+
+
+def test_empty_buckets_raise_rate_limited(monkeypatch, tmp_path) -> None:
+    print("console.log -> telling throttling apart from an outage")
+    monkeypatch.setattr(client_pool, "Client", FakeClient)
+    config = tmp_path / "token_pool_config.json"
+    config.write_text(
+        '{"rate_limit": {"requests_per_minute": 6, "burst": 1}, "tokens": ['
+        '{"id": "a", "csrf_token": "c", "session_token": "s"}]}',
+        encoding="utf-8",
+    )
+    pool = ClientPool(str(config))
+    assert pool.get_client()[0] == "a"
+
+    with pytest.raises(PoolRateLimitedError) as exc_info:
+        pool.get_client()
+    assert exc_info.value.client_id == "a"
+    assert 9 < exc_info.value.retry_after <= 10
+    assert str(exc_info.value) == "All clients are rate limited"
+    status = pool.get_status()["clients"][0]
+    assert status["available"] and status["tokens"] < 1
+
+
+def test_burst_share_is_at_least_one_token() -> None:
+    print("console.log -> rounding each worker's burst share up to one token")
+    wrapper = client_pool.ClientWrapper(
+        FakeClient(), "a", {"requests_per_minute": 60, "burst": 1}, workers=4
+    )
+    assert wrapper.capacity == 1
+    assert wrapper.refill_rate == 0.25
+
+
+def test_removed_client_without_session_is_not_retained(pool: ClientPool) -> None:
+    print("console.log -> letting idle removed clients be garbage-collected")
+    removed = pool.clients["a"]
+    removed.client.has_async_session = False
+    pool.remove_client("a")
+    assert removed not in pool._retired
@@ -0,0 +1,293 @@
+"""Response extraction tests for the HTTP server with console-style output."""
+
+import asyncio
+import importlib
+import threading
+import time
+
+import anyio
+import pytest
+from fastapi.testclient import TestClient
+
+from perplexity import client_pool, http_server
+from perplexity.client_pool import ClientPool
+from perplexity.http_server import _extract_clean_result, _extract_image_result
+
+AUTH = {"Authorization": "Bearer test-token"}
+
+
+class FakeClient:
+    """Stand-in for Client that answers from memory."""
+
+    def __init__(self, cookies=None):
+        self.queries = []
+        self.closed = False
+        self.has_async_session = True
+
+    async def aclose(self):
+        self.closed = True
+
+    async def asearch(self, query, stream=False, **kwargs):
+        self.queries.append(query)
+        sources = {
+            "step_type": "SEARCH_RESULTS",
+            "content": {"web_results": [{"url": "https://a.example"}]},
+        }
+        if stream:
+            return self._partials(sources)
+        return {"answer": "42", "text": [sources]}
+
+    async def _partials(self, sources):
+        yield {"text": [sources]}
+        yield {"answer": "42", "text": [sources]}
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    monkeypatch.setattr(client_pool, "Client", FakeClient)
+    monkeypatch.chdir(tmp_path)
+    for name in (
+        "PPLX_TOKEN_POOL_CONFIG",
+        "PPLX_CSRF_TOKEN",
+        "PPLX_SESSION_TOKEN",
+        "PPLX_ADMIN_TOKEN",
+        "PPLX_MAX_INFLIGHT",
+        "PPLX_CORS_ORIGINS",
+    ):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("PPLX_API_TOKEN", "test-token")
+    monkeypatch.setattr(http_server, "app", http_server.create_app())
+    with TestClient(http_server.app) as client:
+        yield client
+
+
+def test_extract_clean_result_collects_search_results() -> None:
+    print("console.log -> extracting answer and web_results")
+    response = {
+        "answer": "42",
+        "text": [
+            {"step_type": "INITIAL_QUERY", "content": {"query": "q"}},
+            "not-a-step",
+            {
+                "step_type": "SEARCH_RESULTS",
+                "content": {
+                    "web_results": [
+                        {"url": "https://a.example", "name": "A", "snippet": "a"},
+                        {"name": "missing url"},
+                        {"url": "https://b.example", "name": "", "snippet": None},
+                    ]
+                },
+            },
+            {"step_type": "FINAL", "content": {"answer": "{}"}},
+        ],
+    }
+    assert _extract_clean_result(response) == {
+        "answer": "42",
+        "sources": [
+            {"url": "https://a.example", "title": "A", "snippet": "a"},
+            {"url": "https://b.example"},
+        ],
+    }
+
+
+def test_extract_clean_result_falls_back_to_chunks() -> None:
+    print("console.log -> falling back to answer chunks")
+    response = {
+        "text": "unparsed",
+        "chunks": [{"url": "https://c.example", "name": "C"}, {"title": "no url"}],
+    }
+    assert _extract_clean_result(response) == {
+        "answer": "",
+        "sources": [{"url": "https://c.example", "title": "C"}],
+    }
+
+
+def test_lifespan_attaches_pool_to_app_state(api: TestClient) -> None:
+    print("console.log -> building the pool once at startup")
+    assert isinstance(http_server.app.state.pool, ClientPool)
+    body = api.get("/health").json()
+    assert body["pool"] == {"total": 1, "available": 1, "mode": "anonymous"}
+
+
+def test_search_awaits_pool_client(api: TestClient) -> None:
+    print("console.log -> answering /search through the pool")
+    resp = api.post("/search", json={"query": "q"}, headers=AUTH)
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "status": "ok",
+        "client_id": "anonymous",
+        "answer": "42",
+        "web_results": [{"url": "https://a.example"}],
+    }
+    assert http_server.app.state.pool.clients["anonymous"].client.queries == ["q"]
+    assert api.post("/search", json={"query": "q"}).status_code == 401
+
+
+def test_requests_over_inflight_cap_get_429(api: TestClient, monkeypatch) -> None:
+    print("console.log -> shedding load past max_inflight")
+    state = http_server.app.state
+    monkeypatch.setattr(state, "config", state.config._replace(max_inflight=0))
+    resp = api.post("/search", json={"query": "q"}, headers=AUTH)
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "1"
+    assert api.get("/health").status_code == 200
+
+
+def test_admin_endpoints_check_admin_token(api: TestClient, monkeypatch) -> None:
+    print("console.log -> guarding pool management with the admin token")
+    body = {"id": "anonymous"}
+    monkeypatch.setattr(http_server.app.state, "expected_admin", b"")
+    assert api.post("/pool/reset", json=body).status_code == 403
+
+    monkeypatch.setattr(http_server.app.state, "expected_admin", b"admin-secret")
+    assert api.post("/pool/reset", json=body).status_code == 401
+    bad = {"X-Admin-Token": "admin-wrong"}
+    assert api.post("/pool/reset", json=body, headers=bad).status_code == 401
+    good = {"X-Admin-Token": "admin-secret"}
+    assert api.post("/pool/reset", json=body, headers=good).json()["status"] == "ok"
+
+
+def test_extract_image_result_from_text_steps() -> None:
+    print("console.log -> extracting generated images")
+    response = {
+        "text": [
+            {"step_type": "GENERATE_IMAGE_RESULTS", "content": None},
+            {"step_type": "GENERATE_IMAGE", "content": {"prompt": "cat", "caption": "A cat"}},
+            {
+                "step_type": "GENERATE_IMAGE_RESULTS",
+                "content": {"image_results": [{"url": "u", "image_width": 1, "image_height": 2}]},
+            },
+        ]
+    }
+    assert _extract_image_result(response) == {
+        "images": [{"url": "u", "thumbnail_url": None, "width": 1, "height": 2}],
+        "prompt_used": "cat",
+        "caption": "A cat",
+        "model": "",
+    }
+
+
+def test_cors_origins_fall_back_to_wildcard(monkeypatch) -> None:
+    print("console.log -> parsing PPLX_CORS_ORIGINS")
+    monkeypatch.setenv("PPLX_CORS_ORIGINS", " , ")
+    assert http_server._load_config().cors_origins == ("*",)
+    monkeypatch.setenv("PPLX_CORS_ORIGINS", "*, https://a.com")
+    assert http_server._load_config().cors_origins == ("*", "https://a.com")
+
+
+def test_wildcard_cors_serves_static_origin(api) -> None:
+    print("console.log -> answering CORS with a static wildcard")
+    response = api.get("/health", headers={"Origin": "https://example.com"})
+    assert response.headers["access-control-allow-origin"] == "*"
+    assert "access-control-allow-credentials" not in response.headers
+
+
+def test_search_streams_sources_then_answer(api) -> None:
+    print("console.log -> streaming /search as server-sent events")
+    response = api.post("/search", headers=AUTH, json={"query": "q", "stream": True})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n")[0] for block in response.text.strip().split("\n\n")]
+    assert events == ["event: sources", "event: answer", "event: done"]
+    assert '"url":"https://a.example"' in response.text.replace(" ", "")
+
+
+def test_search_returns_503_when_pool_exhausted(api) -> None:
+    print("console.log -> rejecting /search while every client backs off")
+    http_server.app.state.pool.mark_failure("anonymous")
+    response = api.post("/search", headers=AUTH, json={"query": "q"})
+    assert response.status_code == 503
+    assert response.json()["detail"]["pool_status"]["available"] == 0
+
+
+def test_remove_client_closes_its_session(api, monkeypatch) -> None:
+    print("console.log -> closing the session of a removed client")
+    monkeypatch.setattr(http_server.app.state, "expected_admin", b"admin")
+    pool = http_server.app.state.pool
+    pool.add_client("extra", "csrf", "session")
+    removed = pool.clients["anonymous"].client
+
+    response = api.post(
+        "/pool/remove", headers={"X-Admin-Token": "admin"}, json={"id": "anonymous"}
+    )
+    assert response.json()["status"] == "ok"
+    assert removed.closed
+
+
+def test_search_returns_429_when_pool_rate_limited(api) -> None:
+    print("console.log -> answering 429 with Retry-After while buckets refill")
+    wrapper = http_server.app.state.pool.clients["anonymous"]
+    wrapper.capacity, wrapper.refill_rate, wrapper.tokens = 1.0, 0.1, 0.0
+    wrapper.last_refill = time.monotonic()
+    response = api.post("/search", headers=AUTH, json={"query": "q"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
+
+
+def test_open_stream_counts_toward_inflight_cap(api, monkeypatch) -> None:
+    print("console.log -> holding a slot until the stream body finishes")
+    state = http_server.app.state
+    monkeypatch.setattr(state, "config", state.config._replace(max_inflight=1))
+    started, release = threading.Event(), threading.Event()
+
+    async def held_partials(sources):
+        yield {"text": [sources]}
+        started.set()
+        while not release.is_set():
+            await anyio.sleep(0.01)
+        yield {"answer": "42", "text": [sources]}
+
+    http_server.app.state.pool.clients["anonymous"].client._partials = held_partials
+    results = []
+    body = {"query": "q", "stream": True}
+    streamer = threading.Thread(
+        target=lambda: results.append(api.post("/search", headers=AUTH, json=body))
+    )
+    streamer.start()
+    try:
+        assert started.wait(5)
+        assert api.post("/search", headers=AUTH, json={"query": "q"}).status_code == 429
+    finally:
+        release.set()
+        streamer.join(5)
+
+    assert results[0].status_code == 200
+    assert "event: done" in results[0].text
+    assert api.post("/search", headers=AUTH, json={"query": "q"}).status_code == 200
+
+
+def test_main_serves_config_loaded_from_dotenv(monkeypatch) -> None:
+    print("console.log -> building the served app after .env is loaded")
+    import dotenv
+    import uvicorn
+
+    served = {}
+
+    def fake_load_dotenv():
+        monkeypatch.setenv("PPLX_API_TOKEN", "sk-from-dotenv")
+        return True
+
+    def fake_run(target, factory=False, **kwargs):
+        module_name, name = target.split(":")
+        served_app = getattr(importlib.import_module(module_name), name)()
+        served.update(factory=factory, auth=served_app.state.expected_auth)
+
+    monkeypatch.setattr(dotenv, "load_dotenv", fake_load_dotenv)
+    monkeypatch.setattr(uvicorn, "run", fake_run)
+    http_server.main()
+
+    assert served == {"factory": True, "auth": b"Bearer sk-from-dotenv"}
+
+
+def test_stream_stays_in_flight_between_handler_and_body(api) -> None:
+    print("console.log -> counting a stream from the handler until its body ends")
+    pool = http_server.app.state.pool
+    request = http_server.SearchRequest(query="q", stream=True)
+
+    async def run():
+        response = await http_server.search(request, pool)
+        assert pool.clients["anonymous"].in_flight == 1
+        events = [chunk async for chunk in response.body_iterator]
+        assert pool.clients["anonymous"].in_flight == 0
+        return events
+
+    assert asyncio.run(run())[-1].startswith(b"event: done")